@@ -1,12 +1,21 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_from_directory
 import json
 import os
 import requests
-import random
+import tempfile
+import threading
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo  # Timezone support
-from werkzeug.security import generate_password_hash, check_password_hash
+from hashing import hash_password, verify_password, get_hash_stats, HashPoolBusy
+from snapshot import write_snapshot, load_snapshot, read_snapshot_record, json_to_snapshot, replace_file, SNAPSHOT_EXT
+from assets import cache_crest, asset_version, finalize_static_response, CREST_DIR, CREST_PLACEHOLDER
+from ranking import RankIndex
+from profiler import init_profiling, profiled_job
+from ratelimit import init_rate_limiting, get_rate_limit_stats
+import history_store
+from otp_store import issue_otp, has_active_otp, check_otp, OTP_OK, OTP_LOCKED, OTP_EXPIRED
 from apscheduler.schedulers.background import BackgroundScheduler
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 import os
 
@@ -16,17 +25,41 @@ load_dotenv()  # Load environment variables from .env
 app = Flask(__name__)
 app.secret_key = "supersecretkey"  # Change this in production
 
-# Temporary dictionary to store OTPs for testing
-otp_storage = {}
-
-def generate_otp():
-    return str(random.randint(100000, 999999))
+# Behind a reverse proxy, set TRUST_PROXY_HOPS to the number of proxies in front
+# of the app so request.remote_addr (and the per-IP rate limits) see the client
+# from X-Forwarded-For instead of the proxy. Leave it at 0 when exposed directly,
+# or clients can spoof the header.
+TRUST_PROXY_HOPS = int(os.getenv("TRUST_PROXY_HOPS", "0"))
+if TRUST_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUST_PROXY_HOPS, x_proto=TRUST_PROXY_HOPS)
+init_profiling(app)  # off unless PROFILE_SAMPLE_RATE is set (see profiler.py)
+
+# ---------- Rate limits ----------
+# endpoint: (burst, requests per minute, methods or None for all)
+RATE_LIMITS = {
+    "profile": (10, 20, None),
+    "leaderboard": (10, 30, None),
+    "login": (5, 10, ["POST"]),            # scrypt work per attempt
+    "register": (3, 5, ["POST"]),
+    "forgot_password": (3, 5, ["POST"]),
+    "verify_otp": (5, 10, ["POST"]),        # OTP guesses, on top of the per-code lockout
+    "reset_verify_otp": (5, 10, ["POST"]),
+    "predict_batch": (5, 10, ["POST"]),
+}
+init_rate_limiting(app, RATE_LIMITS)  # see ratelimit.py
+
+# OTP purposes (see otp_store.py)
+OTP_VERIFY = "verify"
+OTP_RESET = "reset"
 
 # ---------- File paths ----------
 MATCHES_FILE = "matches.json"
 PREDICTIONS_FILE = "predictions.json"
 USERS_FILE = "users.json"
 
+# "json" (default) or "snapshot" (compact binary files, see snapshot.py)
+DATA_FORMAT = os.getenv("DATA_FORMAT", "json")
+
 # ---------- Leagues to fetch ----------
 # (league_id, league_name)
 LEAGUES = [
@@ -40,32 +73,98 @@ LEAGUES = [
 # ---------- Local timezone ----------
 LOCAL_TZ = "Africa/Johannesburg"
 
+# ---------- Predictions ----------
+DAILY_PREDICTION_LIMIT = 10
+MAX_PREDICTED_GOALS = 20
+LIVE_STATUSES = ["IN_PLAY", "PAUSED"]
+FINISHED_STATUSES = ["FT", "FINISHED", "AWARDED"]
+
 # ---------- Helper functions ----------
+def data_path(json_path):
+    if DATA_FORMAT == "snapshot":
+        path = os.path.splitext(json_path)[0] + SNAPSHOT_EXT
+        # First run after switching to snapshots: convert the JSON file
+        # instead of starting from an empty store
+        if not os.path.exists(path) and os.path.exists(json_path):
+            json_to_snapshot(json_path, path)
+            print(f"✅ Converted {json_path} → {path}")
+        return path
+    return json_path
+
+def load_data(json_path, default):
+    path = data_path(json_path)
+    if not os.path.exists(path):
+        return default
+    if DATA_FORMAT == "snapshot":
+        return load_snapshot(path)
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_data(json_path, data):
+    path = data_path(json_path)
+    if DATA_FORMAT == "snapshot":
+        write_snapshot(path, data)
+        return
+    # Compact JSON, written to a temp file and renamed so readers never see half a file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    replace_file(tmp, path)
+
+def load_record(json_path, key, default):
+    """Loads one top-level entry; snapshots decode only that entry."""
+    path = data_path(json_path)
+    if not os.path.exists(path):
+        return default
+    if DATA_FORMAT == "snapshot":
+        return read_snapshot_record(path, key, default)
+    return load_data(json_path, {}).get(key, default)
+
 def load_matches():
-    if os.path.exists(MATCHES_FILE):
-        with open(MATCHES_FILE, "r") as f:
-            return json.load(f)
-    return []
+    return load_data(MATCHES_FILE, [])
+
+def save_matches(matches):
+    save_data(MATCHES_FILE, matches)
 
 def load_predictions():
-    if os.path.exists(PREDICTIONS_FILE):
-        with open(PREDICTIONS_FILE, "r") as f:
-            return json.load(f)
-    return {}
+    return load_data(PREDICTIONS_FILE, {})
+
+def load_user_predictions(username):
+    return load_record(PREDICTIONS_FILE, username, {})
 
 def save_predictions(predictions):
-    with open(PREDICTIONS_FILE, "w") as f:
-        json.dump(predictions, f, indent=4)
+    save_data(PREDICTIONS_FILE, predictions)
 
 def load_users():
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-    return {}
+    return load_data(USERS_FILE, {})
 
 def save_users(users):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=4)
+    save_data(USERS_FILE, users)
+
+# ---------- Static assets ----------
+def asset_url(filename):
+    # ?v=<content hash> lets browsers cache the file forever
+    return url_for("static", filename=filename, v=asset_version(filename))
+
+def crest_url(crest):
+    # Cached crests already have content-hashed names
+    if crest:
+        return url_for("crest", filename=os.path.basename(crest))
+    return asset_url(CREST_PLACEHOLDER)
+
+@app.route("/crests/<path:filename>")
+def crest(filename):
+    return send_from_directory(CREST_DIR, filename)
+
+@app.context_processor
+def asset_helpers():
+    return {"asset_url": asset_url, "crest_url": crest_url}
+
+@app.after_request
+def static_headers(response):
+    if request.endpoint in ("static", "crest"):
+        return finalize_static_response(request, response)
+    return response
 
 # ---------- Authentication decorator ----------
 def login_required(func):
@@ -78,31 +177,205 @@ def login_required(func):
         return func(*args, **kwargs)
     return wrapped
 
+# Operators (comma-separated usernames) can read the /stats endpoints; nobody by default
+OPERATOR_USERS = {u.strip() for u in os.getenv("OPERATOR_USERS", "").split(",") if u.strip()}
+
+def operator_required(func):
+    from functools import wraps
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+        if session.get("username") not in OPERATOR_USERS:
+            return "Not found", 404
+        return func(*args, **kwargs)
+    return wrapped
+
 # ---------- Calculate points ----------
 def calculate_points():
-    matches = load_matches()
-    predictions = load_predictions()
-    leaderboard = []
-
-    for username, user_preds in predictions.items():
-        total_points = 0
-        for match_id_str, pred in user_preds.items():
-            match_id = int(match_id_str)
-            if match_id >= len(matches):
-                continue
-            actual = matches[match_id]
-            if actual["home_score"] is None or actual["away_score"] is None:
-                continue
+    # Same totals and tie order as the "your rank" card: the history totals
+    # (5 points per exact score) via the rank index
+    index = get_rank_index()
+    with _rank_lock:
+        leaderboard = index.top(len(index))
+
+    for row in leaderboard:
+        row["badge"] = "🏆" if row["points"] >= 1000 else ""
+    return leaderboard
 
-            # Exact score = 5 points
-            if pred["home"] == actual["home_score"] and pred["away"] == actual["away_score"]:
-                total_points += 5
+# ---------- Daily quota ----------
+def count_today_predictions(user_preds, matches, today):
+    today_predictions_count = 0
+    for match_key, pred in user_preds.items():
+        if pred.get("date") == today.isoformat():
+            today_predictions_count += 1
+            continue
+        try:
+            idx = int(match_key)
+            match_dt = datetime.fromisoformat(
+                matches[idx]["utcDate"].replace("Z", "+00:00")
+            ).astimezone(ZoneInfo(LOCAL_TZ))
+            if match_dt.date() == today:
+                today_predictions_count += 1
+        except:
+            pass
+    return today_predictions_count
+
+# ---------- Open matches ----------
+def is_listed(match, match_dt, today):
+    """The homepage's rule: today's or live matches, never past or finished ones."""
+    status = match.get("status", "TIMED")
+    if match_dt.date() < today or status in FINISHED_STATUSES:
+        return False
+    return match_dt.date() == today or status in LIVE_STATUSES
+
+def is_predictable(match, today):
+    """Listed on the homepage and not locked because it's live."""
+    match_dt = datetime.fromisoformat(match["utcDate"].replace("Z", "+00:00")).astimezone(ZoneInfo(LOCAL_TZ))
+    return is_listed(match, match_dt, today) and match.get("status") not in LIVE_STATUSES
+
+# ---------- Prediction history ----------
+# Each user's predictions joined to their match results, with running totals,
+# so /profile only reads that user's row instead of scanning every match.
+# Stored one row per user in history_store.py; refreshed whenever predictions
+# are saved or results arrive.
+_history_lock = threading.Lock()
+HISTORY_REBUILD_ATTEMPTS = 3
+
+# Fixtures hidden from profiles (they still count on the leaderboard)
+EXCLUDED_FIXTURES = {
+    ("Fulham FC", "Nottingham Forest FC"),
+    ("Athletic Club", "RCD Espanyol de Barcelona"),
+}
+
+def load_user_history(username):
+    if history_store.history_version() == 0:
+        refresh_history()
+    return history_store.load_user_history(username) or empty_history()
+
+def empty_history():
+    return {"total_points": 0, "exact_scores": 0, "predictions_count": 0, "matches": {}}
+
+def history_entry(match, pred):
+    status = match.get("status", "SCHEDULED")
+    home_score = match.get("home_score")
+    away_score = match.get("away_score")
+
+    # Leaderboard rule: exact score = 5 points as soon as both scores are known,
+    # whatever the status
+    exact = home_score is not None and away_score is not None \
+        and pred["home"] == home_score and pred["away"] == away_score
+    points = 5 if exact else 0
+    outcome = "UPCOMING"
+
+    # 🔴 LIVE MATCH
+    if status in ["IN_PLAY", "PAUSED"]:
+        outcome = "LIVE"
+
+    # ✅ FINISHED MATCH
+    elif status == "FINISHED":
+        if home_score is not None and away_score is not None:
+            outcome = "WIN" if exact else "LOSE"
+
+    return {
+        "home": match["home"],
+        "away": match["away"],
+        "utcDate": match["utcDate"],
+        "status": status,
+        "home_crest": match.get("home_crest"),
+        "away_crest": match.get("away_crest"),
+        "pred_home": pred["home"],
+        "pred_away": pred["away"],
+        "home_score": home_score,
+        "away_score": away_score,
+        "points": points,
+        "outcome": outcome
+    }
 
-        badge = "🏆" if total_points >= 1000 else ""
-        leaderboard.append({"username": username, "points": total_points, "badge": badge})
+def build_history(matches, user_preds):
+    user_history = empty_history()
+    for match_id_str, pred in sorted(user_preds.items(), key=lambda kv: int(kv[0])):
+        match_id = int(match_id_str)
+        if match_id >= len(matches):
+            continue
+        entry = history_entry(matches[match_id], pred)
+        user_history["matches"][match_id_str] = entry
+        user_history["total_points"] += entry["points"]
+        if entry["points"]:
+            user_history["exact_scores"] += 1
+    user_history["predictions_count"] = len(user_history["matches"])
+    return user_history
+
+def refresh_history(matches=None, predictions=None, usernames=None):
+    """Re-joins predictions with results. Pass usernames to only rebuild those users."""
+    with _history_lock:
+        for attempt in range(HISTORY_REBUILD_ATTEMPTS):
+            # A full rebuild replaces every row, so it only writes if no other
+            # process refreshed a user while it was reading (or retries with
+            # their newer predictions)
+            expected = history_store.history_version() if usernames is None else None
+            current_matches = load_matches() if matches is None else matches
+            current_predictions = load_predictions() if predictions is None else predictions
+            targets = current_predictions if usernames is None else {
+                u: current_predictions.get(u, {}) for u in usernames
+            }
+            history = {u: build_history(current_matches, preds) for u, preds in targets.items()}
+
+            if attempt == HISTORY_REBUILD_ATTEMPTS - 1:
+                print("⚠️ History kept changing during the rebuild, writing it anyway.")
+                expected = None
+            versions = history_store.save_history(history, replace_all=usernames is None,
+                                                  expected_version=expected)
+            if versions is not None:
+                break
 
-    leaderboard.sort(key=lambda x: x["points"], reverse=True)
-    return leaderboard
+        sync_rank_index(history, usernames, *versions)
+    return history
+
+# ---------- Rankings ----------
+# RankIndex (see ranking.py) over the history totals. Each process keeps its own
+# copy and rebuilds it only when another process has written the history.
+_rank_index = None
+_rank_index_version = None
+_rank_lock = threading.Lock()
+
+def sync_rank_index(history, usernames, version_before, version_after):
+    """Applies a history write to the in-process index instead of rebuilding it."""
+    global _rank_index, _rank_index_version
+    with _rank_lock:
+        if usernames is None:
+            _rank_index = RankIndex({u: h["total_points"] for u, h in history.items()})
+        elif _rank_index is not None and _rank_index_version == version_before:
+            for username in usernames:
+                _rank_index.update(username, history[username]["total_points"])
+        else:
+            _rank_index = None
+            return
+        _rank_index_version = version_after
+
+def get_rank_index():
+    global _rank_index, _rank_index_version
+    version = history_store.history_version()
+    if version == 0:
+        refresh_history()
+        version = history_store.history_version()
+    with _rank_lock:
+        if _rank_index is None or version != _rank_index_version:
+            _rank_index_version, points = history_store.load_points()
+            _rank_index = RankIndex(points)
+        return _rank_index
+
+def user_ranking(username, neighbours=2):
+    """Rank, percentile and the users around `username`, or None if they have no predictions."""
+    index = get_rank_index()
+    with _rank_lock:
+        if username not in index:
+            return None
+        return {
+            "rank": index.rank(username),
+            "total": len(index),
+            "points": index.points(username),
+            "percentile": index.percentile(username),
+            "around": index.around(username, neighbours)
+        }
 
 # ---------- Routes ----------
 @app.route("/")
@@ -111,6 +384,7 @@ def index():
     predictions = load_predictions()
     now = datetime.now(ZoneInfo(LOCAL_TZ))
     today = now.date()
+    user_preds = predictions.get(session.get("username"), {})
 
     today_matches = []
 
@@ -119,18 +393,8 @@ def index():
             match["utcDate"].replace("Z", "+00:00")
         ).astimezone(ZoneInfo(LOCAL_TZ))
 
-        status = match.get("status", "TIMED")
-
-        is_today = match_dt.date() == today
-        is_live = status in ["IN_PLAY", "PAUSED"]
-        is_finished = status in ["FT", "FINISHED", "AWARDED"]
-
-        # ❌ NEVER show yesterday or finished matches
-        if match_dt.date() < today or is_finished:
-            continue
-
-        # ✅ Show only today matches or live matches
-        if is_today or is_live:
+        # ✅ Show only today matches or live matches, never yesterday or finished ones
+        if is_listed(match, match_dt, today):
             match["predictions_count"] = sum(
                 1 for user in predictions.values() if str(i) in user
             )
@@ -138,7 +402,8 @@ def index():
             match["global_index"] = i
 
             # 🔒 Lock if live
-            match["locked"] = is_live
+            match["locked"] = match.get("status") in LIVE_STATUSES
+            match["predicted"] = str(i) in user_preds
 
             today_matches.append(match)
 
@@ -161,10 +426,18 @@ def index():
         if league in leagues_dict:
             ordered_matches.extend(leagues_dict[league])
 
-    return render_template("index.html", matches=ordered_matches)
+    remaining_predictions = max(
+        DAILY_PREDICTION_LIMIT - count_today_predictions(user_preds, matches, today), 0
+    )
+
+    return render_template(
+        "index.html",
+        matches=ordered_matches,
+        remaining_predictions=remaining_predictions,
+        max_goals=MAX_PREDICTED_GOALS
+    )
 
 
-import random
 from datetime import datetime, timedelta
 
 @app.route("/register", methods=["GET", "POST"])
@@ -181,7 +454,11 @@ def register():
         if username in users:
             error = "Username already exists."
         else:
-            hashed = generate_password_hash(password)
+            try:
+                hashed = hash_password(password)
+            except HashPoolBusy:
+                error = "⏳ Server is busy, please try again in a moment."
+                return render_template("register.html", error=error)
 
             # Detect email or phone number
             if "@" in contact and "." in contact:
@@ -218,7 +495,12 @@ def login():
                 username = u
                 break
 
-        if not user or not check_password_hash(user["password"], password):
+        try:
+            password_ok = bool(user) and verify_password(user["password"], password)
+        except HashPoolBusy:
+            return render_template("login.html", error="⏳ Server is busy, please try again in a moment.")
+
+        if not password_ok:
             error = "Invalid email or phone number or password."
         elif not user.get("verified", False):
             # Store username temporarily to verify OTP
@@ -248,15 +530,15 @@ def match(match_id):
         return "Match not found", 404
 
     match = matches[match_id]
-    predictions = load_predictions()
     username = session["username"]
 
-    submitted = str(match_id) in predictions.get(username, {})
+    # Only this user's record; in snapshot mode the rest of the file isn't decoded
+    submitted = str(match_id) in load_user_predictions(username)
 
     # 🔒 Prevent predicting live matches
     match_dt = datetime.fromisoformat(match["utcDate"].replace("Z", "+00:00")).astimezone(ZoneInfo(LOCAL_TZ))
     status = match.get("status", "UPCOMING")
-    locked = status in ["IN_PLAY", "PAUSED"]
+    locked = status in LIVE_STATUSES
 
     if request.method == "POST":
         if locked:
@@ -269,28 +551,22 @@ def match(match_id):
 
         today = datetime.now(ZoneInfo(LOCAL_TZ)).date()
 
+        # 🔒 Finished and past matches are closed too, same as on the homepage
+        if not is_listed(match, match_dt, today):
+            flash("⚠️ Predictions for this match are closed.")
+            return redirect(url_for("index"))
+
+        predictions = load_predictions()
+
         # Ensure user predictions dict exists
         if username not in predictions:
             predictions[username] = {}
 
         # Count today's predictions
-        today_predictions_count = 0
-        for match_key, pred in predictions[username].items():
-            if pred.get("date") == today.isoformat():
-                today_predictions_count += 1
-                continue
-            try:
-                idx = int(match_key)
-                match_dt2 = datetime.fromisoformat(
-                    matches[idx]["utcDate"].replace("Z", "+00:00")
-                ).astimezone(ZoneInfo(LOCAL_TZ))
-                if match_dt2.date() == today:
-                    today_predictions_count += 1
-            except:
-                pass
-
-        if today_predictions_count >= 10:
-            flash("🚫 You can only predict 10 matches per day.")
+        today_predictions_count = count_today_predictions(predictions[username], matches, today)
+
+        if today_predictions_count >= DAILY_PREDICTION_LIMIT:
+            flash(f"🚫 You can only predict {DAILY_PREDICTION_LIMIT} matches per day.")
             return redirect(url_for("index"))
 
         home_score = int(request.form["home_score"])
@@ -303,17 +579,85 @@ def match(match_id):
         }
 
         save_predictions(predictions)
+        refresh_history(matches, predictions, usernames=[username])
         flash("✅ Prediction submitted successfully!")
         return redirect(url_for("index"))
 
     return render_template("match.html", match=match, submitted=submitted, locked=locked)
 
 
+@app.route("/predict_batch", methods=["POST"])
+@login_required
+def predict_batch():
+    """Saves scores for several of today's matches with one quota check and one write."""
+    matches = load_matches()
+    predictions = load_predictions()
+    username = session["username"]
+    user_preds = predictions.setdefault(username, {})
+    today = datetime.now(ZoneInfo(LOCAL_TZ)).date()
+
+    # Form fields come in pairs: home_<match_id> / away_<match_id>
+    new_preds = {}
+    skipped = 0
+    for field, value in request.form.items():
+        if not field.startswith("home_"):
+            continue
+        match_key = field[len("home_"):]
+        home = value.strip()
+        away = request.form.get(f"away_{match_key}", "").strip()
+        if not home and not away:
+            continue  # left blank
+
+        try:
+            match_id = int(match_key)
+            home_score = int(home)
+            away_score = int(away)
+        except ValueError:
+            flash("❌ Please enter whole-number scores for both teams.")
+            return redirect(url_for("index"))
+        if not 0 <= match_id < len(matches):
+            flash("❌ Unknown match in your predictions.")
+            return redirect(url_for("index"))
+        if not (0 <= home_score <= MAX_PREDICTED_GOALS and 0 <= away_score <= MAX_PREDICTED_GOALS):
+            flash(f"❌ Scores must be between 0 and {MAX_PREDICTED_GOALS}.")
+            return redirect(url_for("index"))
+
+        # 🔒 Closed (live, finished, not today's) and repeat predictions are skipped, not saved
+        if not is_predictable(matches[match_id], today) or str(match_id) in user_preds:
+            skipped += 1
+            continue
+        new_preds[str(match_id)] = {
+            "home": home_score,
+            "away": away_score,
+            "date": today.isoformat()
+        }
+
+    if not new_preds:
+        flash("⚠️ No new predictions to submit." if skipped else "⚠️ Enter scores for at least one match.")
+        return redirect(url_for("index"))
+
+    remaining = DAILY_PREDICTION_LIMIT - count_today_predictions(user_preds, matches, today)
+    if len(new_preds) > remaining:
+        flash(f"🚫 You can only predict {DAILY_PREDICTION_LIMIT} matches per day "
+              f"({max(remaining, 0)} left today).")
+        return redirect(url_for("index"))
+
+    user_preds.update(new_preds)
+    save_predictions(predictions)
+    refresh_history(matches, predictions, usernames=[username])
+
+    flash(f"✅ {len(new_preds)} prediction(s) submitted successfully!")
+    if skipped:
+        flash(f"⚠️ {skipped} match(es) skipped: already predicted or closed.")
+    return redirect(url_for("index"))
+
+
 @app.route("/leaderboard")
 @login_required
 def leaderboard():
     leaderboard_data = calculate_points()
-    return render_template("leaderboard.html", leaderboard=leaderboard_data)
+    ranking = user_ranking(session["username"])
+    return render_template("leaderboard.html", leaderboard=leaderboard_data, ranking=ranking)
 
 from datetime import datetime, timezone
 
@@ -321,100 +665,29 @@ from datetime import datetime, timezone
 @login_required
 def profile():
     username = session["username"]
-    matches = load_matches()
-
-    # Filter out specific matches manually
-    matches = [
-        m for m in matches
-        if not (
-            (m["home"] == "Fulham FC" and m["away"] == "Nottingham Forest FC") or
-            (m["home"] == "Athletic Club" and m["away"] == "RCD Espanyol de Barcelona")
-        )
-    ]
-    
-    # 🔄 FORCE score refresh BEFORE using data
-    update_scores(matches)
+    history = load_user_history(username)
 
-    predictions = load_predictions()
-    user_preds = predictions.get(username, {})
-
-    today = datetime.now(timezone.utc).date()
-
-    filtered_matches = []
-    for match in matches:
-        # parse match date safely
-        match_date = datetime.fromisoformat(
-            match["utcDate"].replace("Z", "+00:00")
-        ).date()
+    today = datetime.now(timezone.utc).date().isoformat()
 
-        # keep upcoming, live, or finished today only
-        if match.get("status") != "FINISHED" or match_date == today:
-            filtered_matches.append(match)
-
-    matches = filtered_matches
-
-    total_points = 0
-    exact_scores = 0
+    stats = {"total_points": 0, "exact_scores": 0, "predictions_count": 0}
     user_matches = []
-
-    for i, match in enumerate(matches):
-        pred = user_preds.get(str(i))
-        if not pred:
+    for entry in history["matches"].values():
+        if (entry["home"], entry["away"]) in EXCLUDED_FIXTURES:
             continue
+        stats["total_points"] += entry["points"]
+        stats["exact_scores"] += 1 if entry["points"] else 0
+        stats["predictions_count"] += 1
 
-        status = match.get("status", "SCHEDULED")
-        home_score = match.get("home_score")
-        away_score = match.get("away_score")
-
-        points = 0
-        outcome = "UPCOMING"
-
-        # 🔴 LIVE MATCH
-        if status in ["IN_PLAY", "PAUSED"]:
-            outcome = "LIVE"
-
-        # ✅ FINISHED MATCH
-        elif status == "FINISHED":
-            if home_score is not None and away_score is not None:
-                if pred["home"] == home_score and pred["away"] == away_score:
-                    points = 5
-                    exact_scores += 1
-                    outcome = "WIN"
-                else:
-                    outcome = "LOSE"
-
-        # 🕒 UPCOMING
-        else:
-            outcome = "UPCOMING"
-
-
-        total_points += points
-
-        user_matches.append({
-            "home": match["home"],
-            "away": match["away"],
-            "home_logo": match.get("home_logo", "https://via.placeholder.com/64"),
-            "away_logo": match.get("away_logo", "https://via.placeholder.com/64"),
-            "pred_home": pred["home"],
-            "pred_away": pred["away"],
-            "home_score": home_score,
-            "away_score": away_score,
-            "points": points,
-            "outcome": outcome
-        })
-
-    stats = {
-        "total_points": total_points,
-        "exact_scores": exact_scores,
-        "predictions_count": len(user_matches)
-    }
-
-    #print(match["home"], match["away"], home_score, away_score, status)
+        # keep upcoming, live, or finished today only
+        if entry["status"] == "FINISHED" and entry["utcDate"][:10] != today:
+            continue
+        user_matches.append(entry)
 
     return render_template(
         "profile.html",
         username=username,
         stats=stats,
+        ranking=user_ranking(username),
         user_matches=user_matches
     )
 
@@ -444,15 +717,18 @@ def settings():
             new_password = request.form["new_password"]
             confirm_password = request.form["confirm_password"]
 
-            if not check_password_hash(user["password"], current_password):
-                flash("❌ Current password is incorrect.")
-            elif new_password != confirm_password:
-                flash("❌ New password and confirmation do not match.")
-            else:
-                user["password"] = generate_password_hash(new_password)
-                users[username] = user
-                save_users(users)
-                flash("✅ Password updated successfully!")
+            try:
+                if not verify_password(user["password"], current_password):
+                    flash("❌ Current password is incorrect.")
+                elif new_password != confirm_password:
+                    flash("❌ New password and confirmation do not match.")
+                else:
+                    user["password"] = hash_password(new_password)
+                    users[username] = user
+                    save_users(users)
+                    flash("✅ Password updated successfully!")
+            except HashPoolBusy:
+                flash("⏳ Server is busy, please try again in a moment.")
 
         # 🏦 BANKING DETAILS UPDATE
         elif form_type == "bank":
@@ -523,6 +799,14 @@ def reactivate():
 
     return render_template("reactivate.html", message=message)
 
+def send_verify_otp(username):
+    otp = issue_otp(OTP_VERIFY, username)
+    if otp is None:
+        return  # locked after too many wrong attempts
+    print(f"Generated OTP for {username}: {otp}")
+    # In real production, send via email/SMS
+    # For testing, we just print it in the console
+
 @app.route("/verify_otp", methods=["GET", "POST"])
 def verify_otp():
     if "otp_user" not in session:
@@ -534,30 +818,32 @@ def verify_otp():
     user = users.get(username)
     error = None
 
-    # Generate OTP if not already generated
-    if username not in otp_storage:
-        otp_storage[username] = str(random.randint(100000, 999999))
-        print(f"Generated OTP for {username}: {otp_storage[username]}")
-        # In real production, send via email/SMS
-        # For testing, we just print it in the console
+    # Generate OTP if there is no unexpired one
+    if not has_active_otp(OTP_VERIFY, username):
+        send_verify_otp(username)
 
     if request.method == "POST":
         entered_otp = request.form.get("otp").strip()
-        correct_otp = otp_storage.get(username)
+        result = check_otp(OTP_VERIFY, username, entered_otp)
 
-        if entered_otp == correct_otp:
+        if result == OTP_OK:
             user["verified"] = True
             users[username] = user
             save_users(users)
 
-            # Remove OTP from storage
-            otp_storage.pop(username, None)
             session.pop("otp_user", None)
 
             # Auto-login after verification
             session["username"] = username
             flash("✅ Account verified successfully! Logged in.")
             return redirect(url_for("index"))
+        elif result == OTP_LOCKED:
+            session.pop("otp_user", None)
+            flash("❌ Too many wrong attempts. Please try again later.")
+            return redirect(url_for("login"))
+        elif result == OTP_EXPIRED:
+            send_verify_otp(username)
+            error = "⌛ OTP expired. A new OTP has been issued."
         else:
             error = "❌ Incorrect OTP. Please try again."
 
@@ -573,12 +859,10 @@ def forgot_password():
 
         for username, info in users.items():
             if contact == info.get("email") or contact == info.get("phone"):
-                otp = generate_otp()
-
-                # Save OTP temporarily
-                info["reset_otp"] = otp
-                users[username] = info
-                save_users(users)
+                otp = issue_otp(OTP_RESET, username)
+                if otp is None:
+                    error = "❌ Too many wrong attempts. Please try again later."
+                    break
 
                 session["reset_user"] = username
 
@@ -586,8 +870,8 @@ def forgot_password():
                 print(f"\n🔐 PASSWORD RESET OTP for {username}: {otp}\n")
 
                 return redirect(url_for("reset_verify_otp"))
-
-        error = "Account not found."
+        else:
+            error = "Account not found."
 
     return render_template("forgot_password.html", error=error)
 
@@ -599,21 +883,23 @@ def reset_verify_otp():
     if not username:
         return redirect(url_for("login"))
 
-    users = load_users()
-    user = users.get(username)
-
     if request.method == "POST":
         entered_otp = request.form["otp"].strip()
+        result = check_otp(OTP_RESET, username, entered_otp)
 
-        if entered_otp != user.get("reset_otp"):
-            error = "Invalid OTP."
-        else:
-            user.pop("reset_otp", None)
-            users[username] = user
-            save_users(users)
-
+        if result == OTP_OK:
             session["reset_verified"] = True
             return redirect(url_for("reset_password"))
+        elif result == OTP_LOCKED:
+            session.pop("reset_user", None)
+            flash("❌ Too many wrong attempts. Please try again later.")
+            return redirect(url_for("forgot_password"))
+        elif result == OTP_EXPIRED:
+            session.pop("reset_user", None)
+            flash("⌛ OTP expired. Request a new one.")
+            return redirect(url_for("forgot_password"))
+        else:
+            error = "Invalid OTP."
 
     return render_template("reset_verify_otp.html", error=error)
 
@@ -634,7 +920,11 @@ def reset_password():
         if password != confirm:
             error = "Passwords do not match."
         else:
-            user["password"] = generate_password_hash(password)
+            try:
+                user["password"] = hash_password(password)
+            except HashPoolBusy:
+                error = "⏳ Server is busy, please try again in a moment."
+                return render_template("reset_password.html", error=error)
             user.pop("reset_otp", None)
 
             users[username] = user
@@ -649,24 +939,48 @@ def reset_password():
     return render_template("reset_password.html", error=error)
 
 
+@app.route("/stats/hashing")
+@login_required
+@operator_required
+def hashing_stats():
+    # Queue depth and timings for tuning PASSWORD_HASH_METHOD / pool size
+    return jsonify(get_hash_stats())
+
+@app.route("/stats/ratelimit")
+@login_required
+@operator_required
+def ratelimit_stats():
+    # Allowed / limited request counts per endpoint, this process only
+    return jsonify(get_rate_limit_stats())
+
+
 # ---------- Fetch matches ----------
 API_TOKEN = os.getenv("FOOTBALL_API_KEY")
+API_BASE_URL = os.getenv("FOOTBALL_API_URL", "https://api.football-data.org/v4")
+PLACEHOLDER_LOGO = "https://via.placeholder.com/64"
+
+def attach_crests(matches):
+    """Caches crests locally (see assets.py) for matches that don't have them yet."""
+    for match in matches:
+        for side in ("home", "away"):
+            logo = match.get(f"{side}_logo")
+            if match.get(f"{side}_crest") or not logo or logo == PLACEHOLDER_LOGO:
+                continue
+            crest = cache_crest(logo)
+            if crest:
+                match[f"{side}_crest"] = crest
 
 def fetch_matches():
     headers = {"X-Auth-Token": API_TOKEN}
     today = datetime.now(ZoneInfo(LOCAL_TZ)).date()
 
     # Load existing matches
-    if os.path.exists(MATCHES_FILE):
-        with open(MATCHES_FILE, "r") as f:
-            all_matches = json.load(f)
-    else:
-        all_matches = []
+    all_matches = load_matches()
 
     existing_keys = {(m["home"], m["away"], m["utcDate"]) for m in all_matches}
 
     for league_id, league_name in LEAGUES:
-        url = f"https://api.football-data.org/v4/competitions/{league_id}/matches?status=SCHEDULED"
+        url = f"{API_BASE_URL}/competitions/{league_id}/matches?status=SCHEDULED"
         response = requests.get(url, headers=headers)
         if response.status_code != 200:
             print(f"Error fetching league {league_name}: {response.status_code}")
@@ -694,13 +1008,15 @@ def fetch_matches():
                     "away_score": None,
                     "status": "UPCOMING",
                     "localDate": match_dt.isoformat(),
-                    "home_logo": home_team.get("crest", "https://via.placeholder.com/64"),
-                    "away_logo": away_team.get("crest", "https://via.placeholder.com/64"),
+                    "home_logo": home_team.get("crest", PLACEHOLDER_LOGO),
+                    "away_logo": away_team.get("crest", PLACEHOLDER_LOGO),
                     "league_name": league_name
                 })
 
-    with open(MATCHES_FILE, "w") as f:
-        json.dump(all_matches, f, indent=4)
+    # Download each crest once; pages then serve them from /crests
+    attach_crests(all_matches)
+
+    save_matches(all_matches)
     print(f"✅ Matches fetched and updated: {len(all_matches)}")
     return all_matches
 
@@ -711,7 +1027,7 @@ def update_match_results():
 
     for league_id, _ in LEAGUES:
         # Fetch finished matches
-        url_finished = f"https://api.football-data.org/v4/competitions/{league_id}/matches?status=FINISHED"
+        url_finished = f"{API_BASE_URL}/competitions/{league_id}/matches?status=FINISHED"
         response = requests.get(url_finished, headers=headers)
         if response.status_code == 200:
             data = response.json()
@@ -724,7 +1040,7 @@ def update_match_results():
                         match["outcome"] = "WIN" if match.get("pred_home") == match["home_score"] and match.get("pred_away") == match["away_score"] else "LOSE"
 
         # Fetch live matches
-        url_live = f"https://api.football-data.org/v4/competitions/{league_id}/matches?status=LIVE"
+        url_live = f"{API_BASE_URL}/competitions/{league_id}/matches?status=LIVE"
         response = requests.get(url_live, headers=headers)
         if response.status_code == 200:
             data = response.json()
@@ -736,20 +1052,16 @@ def update_match_results():
                         match["away_score"] = match_data["score"]["live"]["away"]
                         match["outcome"] = "LIVE"
 
-    with open(MATCHES_FILE, "w") as f:
-        json.dump(matches, f, indent=4)
+    save_matches(matches)
+    refresh_history(matches)
 
     print("✅ Match results updated automatically (including live matches).")
 
-def save_matches(matches):
-    with open(MATCHES_FILE, "w") as f:
-        json.dump(matches, f, indent=4)
-
 def update_scores(matches):
     headers = {"X-Auth-Token": API_TOKEN}
     print("🔄 Updating all live & finished scores...")
 
-    url = "https://api.football-data.org/v4/matches"
+    url = f"{API_BASE_URL}/matches"
     response = requests.get(url, headers=headers)
     if response.status_code != 200:
         print(f"⚠️ Failed to fetch matches: {response.status_code}")
@@ -795,13 +1107,14 @@ def update_scores(matches):
               f"scores: {match['home_score']}-{match['away_score']}")
 
     save_matches(matches)
+    refresh_history(matches)
 
 
 def update_live_scores(matches):
     headers = {"X-Auth-Token": API_TOKEN}
     print("🔄 Updating live & finished scores...")
 
-    url = "https://api.football-data.org/v4/matches"
+    url = f"{API_BASE_URL}/matches"
     response = requests.get(url, headers=headers)
     if response.status_code != 200:
         print(f"⚠️ Failed to fetch matches: {response.status_code}")
@@ -847,22 +1160,28 @@ def update_live_scores(matches):
               f"scores: {match.get('home_score')}-{match.get('away_score')}")
 
     save_matches(matches)
+    refresh_history(matches)
 
 
 # ---------- Auto-reset leaderboard ----------
 def reset_leaderboard():
     save_predictions({})
+    refresh_history(predictions={})
     print("🔄 Leaderboard has been reset automatically.")
 
 # ---------- Scheduler ----------
 scheduler = BackgroundScheduler()
-scheduler.add_job(lambda: update_scores(load_matches()), 'interval', minutes=5)
-scheduler.add_job(fetch_matches, 'interval', minutes=10)         # fetch new today matches every 10 min
-scheduler.add_job(reset_leaderboard, 'cron', day_of_week='mon', hour=0)
-scheduler.start()
+scheduler.add_job(profiled_job("update_scores", lambda: update_scores(load_matches())), 'interval', minutes=5)
+scheduler.add_job(profiled_job("fetch_matches", fetch_matches), 'interval', minutes=10)  # fetch new today matches every 10 min
+scheduler.add_job(profiled_job("reset_leaderboard", reset_leaderboard), 'cron', day_of_week='mon', hour=0)
+
+# Scripts that only need the helpers (e.g. backfill.py) set GOPREDICT_BACKGROUND=0.
+# Hashing workers re-import `python app.py` as __mp_main__ and must not start it either.
+if os.getenv("GOPREDICT_BACKGROUND", "1") == "1" and __name__ != "__mp_main__":
+    scheduler.start()
 
-# ---------- Fetch today matches immediately at startup ----------
-fetch_matches()  # ensures homepage has data on app start
+    # ---------- Fetch today matches immediately at startup ----------
+    fetch_matches()  # ensures homepage has data on app start
 
 
 # ---------- Run ----------
@@ -0,0 +1,195 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import requests
+
+try:
+    from PIL import Image  # optional, only used to shrink crests
+except ImportError:
+    Image = None
+
+try:
+    import brotli  # optional, gzip is used when it's missing
+except ImportError:
+    brotli = None
+
+# Team crests are downloaded once at ingest and served from /crests under
+# content-hashed names, so pages never hit the crest CDN and every static
+# file can be cached by browsers for a year.
+
+# ---------- Settings ----------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+CREST_DIR = os.getenv("CREST_DIR", os.path.join(STATIC_DIR, "crests"))
+CREST_INDEX_FILE = os.getenv("CREST_INDEX_FILE", os.path.join(BASE_DIR, "crest_index.json"))   # url -> file
+CREST_PLACEHOLDER = "crests/placeholder.svg"   # lives in /static, not CREST_DIR
+CREST_SIZE = int(os.getenv("CREST_SIZE", "64"))   # max width/height in px, 0 = keep original
+
+CACHE_FOREVER = "public, max-age=31536000, immutable"
+COMPRESSIBLE_TYPES = {"text/css", "text/javascript", "application/javascript",
+                      "application/json", "image/svg+xml", "text/plain"}
+
+_EXTENSIONS = {"image/png": ".png", "image/svg+xml": ".svg", "image/jpeg": ".jpg",
+               "image/gif": ".gif", "image/webp": ".webp"}
+
+_crest_lock = threading.Lock()
+_crest_index = None
+_failed_urls = set()      # don't retry broken crest URLs on every fetch in this process
+_versions = {}            # filename -> (mtime, digest)
+_compressed = {}          # (path, mtime, encoding) -> bytes
+
+
+# ---------- Crest cache ----------
+def _load_crest_index():
+    global _crest_index
+    if _crest_index is None:
+        if os.path.exists(CREST_INDEX_FILE):
+            with open(CREST_INDEX_FILE, "r") as f:
+                _crest_index = json.load(f)
+        else:
+            _crest_index = {}
+    return _crest_index
+
+
+def _save_crest_index(index):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(CREST_INDEX_FILE), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(index, f, indent=4)
+    os.replace(tmp, CREST_INDEX_FILE)
+
+
+def crest_path(crest):
+    """Where a cached crest ("crests/<hash>.<ext>") lives on disk."""
+    return os.path.join(CREST_DIR, os.path.basename(crest))
+
+
+def _resize(content, ext):
+    if Image is None or CREST_SIZE <= 0 or ext == ".svg":
+        return content, ext
+    try:
+        image = Image.open(io.BytesIO(content))
+        image.thumbnail((CREST_SIZE, CREST_SIZE))
+        out = io.BytesIO()
+        image.save(out, format="PNG", optimize=True)
+        return out.getvalue(), ".png"
+    except Exception as e:
+        print(f"⚠️ Could not resize crest: {e}")
+        return content, ext
+
+
+def cache_crest(url):
+    """Returns the cached name ("crests/<hash>.<ext>") of a crest, downloading it the first time."""
+    if not url or url in _failed_urls:
+        return None
+
+    with _crest_lock:
+        index = _load_crest_index()
+        cached = index.get(url)
+        if cached and os.path.exists(crest_path(cached)):
+            return cached
+
+    try:
+        response = requests.get(url, timeout=10)
+    except requests.RequestException as e:
+        print(f"⚠️ Could not download crest {url}: {e}")
+        _failed_urls.add(url)
+        return None
+    if response.status_code != 200:
+        print(f"⚠️ Could not download crest {url}: {response.status_code}")
+        _failed_urls.add(url)
+        return None
+
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+    ext = _EXTENSIONS.get(content_type) or os.path.splitext(url.split("?")[0])[1].lower() or ".png"
+    content, ext = _resize(response.content, ext)
+    filename = f"crests/{hashlib.sha256(content).hexdigest()[:16]}{ext}"
+
+    with _crest_lock:
+        os.makedirs(CREST_DIR, exist_ok=True)
+        path = crest_path(filename)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(content)
+        index = _load_crest_index()
+        index[url] = filename
+        _save_crest_index(index)
+    return filename
+
+
+# ---------- Static assets ----------
+def asset_version(filename):
+    """Short content hash of a static file, used to fingerprint its URL."""
+    path = os.path.join(STATIC_DIR, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _versions.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, "rb") as f:
+        digest = hashlib.md5(f.read()).hexdigest()[:12]
+    _versions[filename] = (mtime, digest)
+    return digest
+
+
+def _compress(path, mtime, encoding, data):
+    key = (path, mtime, encoding)
+    if key not in _compressed:
+        if encoding == "br":
+            _compressed[key] = brotli.compress(data)
+        else:
+            _compressed[key] = gzip.compress(data, compresslevel=9, mtime=0)
+    return _compressed[key]
+
+
+def finalize_static_response(request, response):
+    """Adds long-lived cache headers and gzip/brotli encoding to /static and /crests responses."""
+    filename = request.view_args.get("filename", "") if request.view_args else ""
+
+    # Content-hashed crests and fingerprinted URLs (?v=<current hash>) never change
+    if request.endpoint == "crest":
+        path, fingerprinted = crest_path(filename), True
+    else:
+        version = request.args.get("v")
+        path = os.path.join(STATIC_DIR, filename)
+        fingerprinted = version is not None and version == asset_version(filename)
+    if fingerprinted and response.status_code in (200, 304):
+        response.headers["Cache-Control"] = CACHE_FOREVER
+        response.expires = None
+
+    if response.status_code != 200 or response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    if "Content-Encoding" in response.headers:
+        return response
+
+    accepted = request.headers.get("Accept-Encoding", "")
+    if brotli is not None and "br" in accepted:
+        encoding = "br"
+    elif "gzip" in accepted:
+        encoding = "gzip"
+    else:
+        response.vary.add("Accept-Encoding")
+        return response
+
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return response
+
+    response.direct_passthrough = False
+    body = _compress(path, mtime, encoding, response.get_data())
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    etag, weak = response.get_etag()
+    if etag:
+        # Werkzeug already compared If-None-Match against the plain ETag, so
+        # repeat the check now that the encoded body has its own
+        response.set_etag(f"{etag}-{encoding}", weak)
+        response.make_conditional(request)
+    return response
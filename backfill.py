@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+import requests
+
+# Only the helpers are needed: don't start the scheduler or fetch on import
+os.environ.setdefault("GOPREDICT_BACKGROUND", "0")
+import app  # noqa: E402
+
+# Bulk backfill of results for every configured league over a date range.
+#
+#   python backfill.py --from 2025-08-01 --to 2025-12-31
+#
+# The range is pulled in chunks (football-data.org allows at most 10 days per
+# request). Progress and results are checkpointed after every chunk, so an
+# interrupted run picks up where it stopped. matches.json is written once, at
+# the end.
+
+CHECKPOINT_FILE = "backfill_checkpoint.json"
+MAX_CHUNK_DAYS = 10
+REQUEST_DELAY = 6.5      # free tier: 10 requests per minute
+MAX_RETRIES = 3
+
+
+# ---------- Streaming ----------
+def iter_json_array(chunks, key):
+    """Yields the items of the top-level array `key` while the body is still downloading.
+
+    Raises ValueError if the body has no such array or ends before it closes,
+    so a truncated response is never mistaken for a complete one.
+    """
+    decoder = json.JSONDecoder()
+    marker = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    buf = ""
+    in_array = False
+
+    for chunk in chunks:
+        buf += chunk
+        if not in_array:
+            found = marker.search(buf)
+            if not found:
+                continue
+            buf = buf[found.end():]
+            in_array = True
+
+        while True:
+            buf = buf.lstrip(" \t\r\n,")
+            if not buf:
+                break
+            if buf[0] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                break  # item not fully downloaded yet
+            yield item
+            buf = buf[end:]
+
+    if not in_array:
+        raise ValueError(f'no "{key}" array in the response')
+    raise ValueError(f'response ended before the "{key}" array closed')
+
+
+def fetch_chunk(session, league_id, date_from, date_to):
+    url = f"{app.API_BASE_URL}/competitions/{league_id}/matches"
+    params = {"dateFrom": date_from.isoformat(), "dateTo": date_to.isoformat()}
+
+    for _ in range(MAX_RETRIES):
+        response = session.get(url, params=params, stream=True, timeout=30)
+        if response.status_code == 429:
+            wait = int(response.headers.get("X-RequestCounter-Reset", 60))
+            print(f"⏳ Rate limited, waiting {wait}s...")
+            response.close()
+            time.sleep(wait)
+            continue
+        if response.status_code != 200:
+            response.close()
+            raise RuntimeError(f"league {league_id} {date_from}..{date_to}: HTTP {response.status_code}")
+
+        response.encoding = "utf-8"
+        with response:
+            try:
+                yield from iter_json_array(response.iter_content(65536, decode_unicode=True), "matches")
+            except ValueError as e:
+                raise RuntimeError(f"league {league_id} {date_from}..{date_to}: {e}") from None
+        return
+
+    raise RuntimeError(f"league {league_id} {date_from}..{date_to}: still rate limited")
+
+
+# ---------- Results ----------
+def match_key(home, away, utc_date):
+    # Same rule as update_scores(): teams plus kickoff date, ignoring the time
+    return f"{home.strip()}|{away.strip()}|{utc_date[:10]}"
+
+
+def result_from_api(api_match, league_name):
+    status = api_match.get("status", "UPCOMING")
+    score = api_match.get("score", {})
+    if status in ["IN_PLAY", "PAUSED"]:
+        scores = score.get("regularTime") or {}
+    elif status == "FINISHED":
+        scores = score.get("fullTime") or {}
+    else:
+        scores = {}
+
+    return {
+        "home": api_match["homeTeam"]["name"],
+        "away": api_match["awayTeam"]["name"],
+        "utcDate": api_match["utcDate"],
+        "status": status,
+        "home_score": scores.get("home"),
+        "away_score": scores.get("away"),
+        "home_logo": api_match["homeTeam"].get("crest", app.PLACEHOLDER_LOGO),
+        "away_logo": api_match["awayTeam"].get("crest", app.PLACEHOLDER_LOGO),
+        "league_name": league_name,
+    }
+
+
+def merge_results(matches, results, add_missing=False):
+    """Applies results to the saved matches through a keyed lookup. Returns (updated, added)."""
+    by_key = {match_key(m["home"], m["away"], m["utcDate"]): m for m in matches}
+    updated = added = 0
+
+    for key, result in results.items():
+        match = by_key.get(key)
+        if match is not None:
+            match["status"] = result["status"]
+            match["home_score"] = result["home_score"]
+            match["away_score"] = result["away_score"]
+            updated += 1
+        elif add_missing:
+            match_dt = datetime.fromisoformat(
+                result["utcDate"].replace("Z", "+00:00")
+            ).astimezone(ZoneInfo(app.LOCAL_TZ))
+            matches.append(dict(result, localDate=match_dt.isoformat()))
+            by_key[key] = matches[-1]
+            added += 1
+
+    return updated, added
+
+
+# ---------- Checkpoint ----------
+def load_checkpoint(path, params):
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("params") == params:
+            return checkpoint
+        print("⚠️ Checkpoint is for a different range or leagues, starting over.")
+    return {"params": params, "done": [], "results": {}}
+
+
+def save_checkpoint(path, checkpoint):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def date_chunks(start, end, days):
+    while start <= end:
+        chunk_end = min(start + timedelta(days=days - 1), end)
+        yield start, chunk_end
+        start = chunk_end + timedelta(days=1)
+
+
+def backfill(date_from, date_to, leagues, chunk_days=MAX_CHUNK_DAYS, add_missing=False,
+             checkpoint_path=CHECKPOINT_FILE, delay=REQUEST_DELAY):
+    params = {"from": date_from.isoformat(), "to": date_to.isoformat() if date_to else None,
+              "leagues": [league_id for league_id, _ in leagues], "chunk_days": chunk_days}
+    checkpoint = load_checkpoint(checkpoint_path, params)
+
+    # No end date = today, fixed when the checkpoint was started, so resuming
+    # on a later day keeps the progress instead of starting over
+    if date_to is None:
+        today = datetime.now(ZoneInfo(app.LOCAL_TZ)).date()
+        date_to = date.fromisoformat(checkpoint.setdefault("until", today.isoformat()))
+    done = set(checkpoint["done"])
+    results = checkpoint["results"]
+
+    session = requests.Session()
+    session.headers["X-Auth-Token"] = app.API_TOKEN or ""
+
+    for league_id, league_name in leagues:
+        for start, end in date_chunks(date_from, date_to, chunk_days):
+            chunk_id = f"{league_id}:{start.isoformat()}"
+            if chunk_id in done:
+                continue
+
+            count = 0
+            for api_match in fetch_chunk(session, league_id, start, end):
+                result = result_from_api(api_match, league_name)
+                results[match_key(result["home"], result["away"], result["utcDate"])] = result
+                count += 1
+
+            checkpoint["done"].append(chunk_id)
+            done.add(chunk_id)
+            save_checkpoint(checkpoint_path, checkpoint)
+            print(f"✅ {league_name} {start} → {end}: {count} matches")
+            time.sleep(delay)
+
+    # Single bulk write once every chunk is in
+    matches = app.load_matches()
+    updated, added = merge_results(matches, results, add_missing)
+    app.save_matches(matches)
+    app.refresh_history(matches)
+    os.remove(checkpoint_path)
+    print(f"✅ Backfill complete: {updated} matches updated, {added} added.")
+    return updated, added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill match results from football-data.org")
+    parser.add_argument("--from", dest="date_from", required=True, type=date.fromisoformat,
+                        help="first kickoff date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat,
+                        help="last kickoff date, YYYY-MM-DD (default: today)")
+    parser.add_argument("--league", dest="leagues", type=int, action="append",
+                        help="league id to include (repeatable, default: all LEAGUES)")
+    parser.add_argument("--chunk-days", type=int, default=MAX_CHUNK_DAYS)
+    parser.add_argument("--delay", type=float, default=REQUEST_DELAY,
+                        help="seconds to wait between API requests")
+    parser.add_argument("--add-missing", action="store_true",
+                        help="also add matches that aren't in matches.json yet")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    if args.date_from > (args.date_to or datetime.now(ZoneInfo(app.LOCAL_TZ)).date()):
+        parser.error("--from must not be after --to")
+    if not 1 <= args.chunk_days <= MAX_CHUNK_DAYS:
+        parser.error(f"--chunk-days must be between 1 and {MAX_CHUNK_DAYS}")
+
+    leagues = app.LEAGUES
+    if args.leagues:
+        leagues = [league for league in app.LEAGUES if league[0] in args.leagues]
+        unknown = set(args.leagues) - {league_id for league_id, _ in leagues}
+        if unknown:
+            parser.error(f"unknown league id(s): {sorted(unknown)}")
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    try:
+        backfill(args.date_from, args.date_to, leagues, args.chunk_days,
+                 args.add_missing, args.checkpoint, args.delay)
+    except (RuntimeError, requests.RequestException) as e:
+        print(f"⚠️ Backfill stopped: {e}. Run the same command again to resume.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing runs in worker processes so scrypt never holds the web
+# worker's GIL. The pool never forks the threaded web process: workers come
+# from a forkserver (spawn where that's unavailable), and this module has no
+# import-time side effects, which keeps it safe for them to import.
+
+# ---------- Settings ----------
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", "2"))      # 0 = hash inline
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "32"))       # max jobs queued or running
+HASH_QUEUE_TIMEOUT = float(os.getenv("HASH_QUEUE_TIMEOUT", "5"))  # seconds to wait for a slot
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+HASH_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class HashPoolBusy(Exception):
+    """Raised when the hashing queue stays full for HASH_QUEUE_TIMEOUT seconds."""
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(HASH_QUEUE_LIMIT, 1))
+_stats_lock = threading.Lock()
+_in_flight = 0
+
+hash_stats = {
+    "hash": {"count": 0, "total_ms": 0.0, "run_total_ms": 0.0, "max_ms": 0.0},
+    "verify": {"count": 0, "total_ms": 0.0, "run_total_ms": 0.0, "max_ms": 0.0},
+    "rejected": 0,
+}
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=HASH_POOL_WORKERS,
+                                        mp_context=multiprocessing.get_context(HASH_START_METHOD))
+        return _pool
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:  # another thread may already have replaced it
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(fn, *args):
+    # A worker dying (e.g. OOM-killed) breaks the whole pool: replace it and
+    # retry once, but never fall back to hashing in the request thread
+    for _ in range(2):
+        pool = _get_pool()
+        try:
+            return pool.submit(_timed, fn, *args).result()
+        except BrokenProcessPool:
+            _reset_pool(pool)
+    raise HashPoolBusy()
+
+
+def _timed(fn, *args):
+    """Runs in the worker: returns the result plus the pure hashing time."""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def _record(kind, run_ms, total_ms):
+    with _stats_lock:
+        entry = hash_stats[kind]
+        entry["count"] += 1
+        entry["total_ms"] += total_ms
+        entry["max_ms"] = max(entry["max_ms"], total_ms)
+        entry["run_total_ms"] += run_ms
+
+
+def _run(kind, fn, *args):
+    global _in_flight
+    if not _slots.acquire(timeout=HASH_QUEUE_TIMEOUT):
+        with _stats_lock:
+            hash_stats["rejected"] += 1
+        raise HashPoolBusy()
+
+    with _stats_lock:
+        _in_flight += 1
+    started = time.perf_counter()
+    try:
+        if HASH_POOL_WORKERS <= 0:
+            result, run_ms = _timed(fn, *args)
+        else:
+            result, run_ms = _submit(fn, *args)
+    finally:
+        with _stats_lock:
+            _in_flight -= 1
+        _slots.release()
+
+    _record(kind, run_ms, (time.perf_counter() - started) * 1000)
+    return result
+
+
+def hash_password(password):
+    return _run("hash", generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(pwhash, password):
+    return _run("verify", check_password_hash, pwhash, password)
+
+
+def get_hash_stats():
+    """Snapshot of hashing timings, used to tune the scrypt cost parameters."""
+    with _stats_lock:
+        stats = {"method": PASSWORD_HASH_METHOD,
+                 "workers": HASH_POOL_WORKERS,
+                 "queue_limit": HASH_QUEUE_LIMIT,
+                 "in_flight": _in_flight,
+                 "rejected": hash_stats["rejected"]}
+        for kind in ("hash", "verify"):
+            entry = hash_stats[kind]
+            count = entry["count"] or 1
+            stats[kind] = {
+                "count": entry["count"],
+                "avg_ms": round(entry["total_ms"] / count, 2),
+                "avg_run_ms": round(entry["run_total_ms"] / count, 2),
+                "max_ms": round(entry["max_ms"], 2),
+            }
+    return stats
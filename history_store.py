@@ -0,0 +1,109 @@
+import json
+import os
+import sqlite3
+
+# Prediction history lives in SQLite, one row per user, so a profile view
+# reads only that user's row and a single user's refresh rewrites only that
+# row, whatever DATA_FORMAT is. A version counter is bumped on every write so
+# each process can tell when its in-memory rank index is stale.
+
+# ---------- Settings ----------
+HISTORY_DB_FILE = os.getenv("HISTORY_DB_FILE", "history.db")
+
+
+def _connect():
+    conn = sqlite3.connect(HISTORY_DB_FILE, timeout=5, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS history (
+            username          TEXT PRIMARY KEY,
+            total_points      INTEGER NOT NULL,
+            exact_scores      INTEGER NOT NULL,
+            predictions_count INTEGER NOT NULL,
+            matches           TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (version INTEGER NOT NULL)")
+    conn.execute("INSERT INTO meta (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM meta)")
+    return conn
+
+
+def _version(conn):
+    return conn.execute("SELECT version FROM meta").fetchone()[0]
+
+
+def history_version():
+    """Write counter; 0 means the history has never been built."""
+    conn = _connect()
+    try:
+        return _version(conn)
+    finally:
+        conn.close()
+
+
+def load_user_history(username):
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT total_points, exact_scores, predictions_count, matches FROM history WHERE username = ?",
+            (username,),
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return {
+        "total_points": row[0],
+        "exact_scores": row[1],
+        "predictions_count": row[2],
+        "matches": json.loads(row[3])
+    }
+
+
+def load_points():
+    """(version, {username: total_points}) read as one consistent snapshot."""
+    conn = _connect()
+    try:
+        conn.execute("BEGIN")
+        version = _version(conn)
+        points = dict(conn.execute("SELECT username, total_points FROM history"))
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return version, points
+
+
+def save_history(histories, replace_all=False, expected_version=None):
+    """Writes {username: history} rows; replace_all drops every other user.
+
+    Returns (version before, version after) so callers can tell whether
+    anyone else wrote in between. With expected_version, nothing is written
+    and None is returned if the history has changed since that version.
+    """
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        before = _version(conn)
+        if expected_version is not None and before != expected_version:
+            conn.execute("ROLLBACK")
+            return None
+        if replace_all:
+            conn.execute("DELETE FROM history")
+        conn.executemany(
+            "INSERT OR REPLACE INTO history (username, total_points, exact_scores, predictions_count, matches) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (username, h["total_points"], h["exact_scores"], h["predictions_count"],
+                 json.dumps(h["matches"], separators=(",", ":")))
+                for username, h in histories.items()
+            ],
+        )
+        conn.execute("UPDATE meta SET version = version + 1")
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return before, before + 1
@@ -0,0 +1,404 @@
+import argparse
+import json
+import os
+import queue
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import requests
+from werkzeug.security import generate_password_hash
+
+os.environ.setdefault("GOPREDICT_BACKGROUND", "0")
+import app  # noqa: E402  (LEAGUES, limits and the session signer)
+from snapshot import load_snapshot, json_to_snapshot, SNAPSHOT_EXT  # noqa: E402
+
+# Kickoff-surge load test.
+#
+#   python loadtest.py --users 200 --concurrency 50 --duration 60
+#
+# Boots app.py in a temporary directory with a generated dataset and a local
+# stand-in for football-data.org, drives a concurrent mix of logins, homepage
+# reloads, prediction POSTs, leaderboard refreshes and settings saves, then
+# reports throughput / tail latency / errors and checks the data files for
+# writes the app acknowledged but lost.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = "loadtest-password"
+DEFAULT_MIX = "home=5,predict=3,leaderboard=2,login=1,bank=1"
+PREDICT_OK = "✅ Prediction submitted successfully!"   # flashed by app.match()
+
+
+# ---------- Dataset ----------
+def generate_dataset(data_dir, users, matches, hash_method, crest_base):
+    now = datetime.now(timezone.utc)
+    password_hash = generate_password_hash(PASSWORD, hash_method)  # shared: one scrypt run, not one per user
+
+    user_data = {
+        f"user{i}": {"password": password_hash, "email": f"user{i}@loadtest.local",
+                     "phone": "", "verified": True}
+        for i in range(users)
+    }
+
+    match_data = []
+    for i in range(matches):
+        league_id, league_name = app.LEAGUES[i % len(app.LEAGUES)]
+        kickoff = now + timedelta(minutes=5 + i)   # kickoffs a minute apart, starting soon
+        match_data.append({
+            "home": f"Home FC {i}",
+            "away": f"Away FC {i}",
+            "utcDate": kickoff.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "home_score": None,
+            "away_score": None,
+            "status": "TIMED",
+            "localDate": kickoff.isoformat(),
+            "home_logo": f"{crest_base}/home{i}.svg",
+            "away_logo": f"{crest_base}/away{i}.svg",
+            "league_name": league_name,
+            "league_id": league_id,
+        })
+
+    for name, data in (("users.json", user_data), ("predictions.json", {}), ("matches.json", match_data)):
+        with open(os.path.join(data_dir, name), "w") as f:
+            json.dump(data, f)
+    return list(user_data), match_data
+
+
+# ---------- Fake football-data.org ----------
+def api_match(match):
+    return {
+        "utcDate": match["utcDate"],
+        "status": "TIMED",
+        "homeTeam": {"name": match["home"], "crest": match["home_logo"]},
+        "awayTeam": {"name": match["away"], "crest": match["away_logo"]},
+        "score": {"fullTime": {"home": None, "away": None},
+                  "regularTime": {"home": None, "away": None}},
+    }
+
+
+def start_fake_api(matches):
+    """Serves `matches` (filled in by the caller once the port is known) like football-data.org."""
+    crest_svg = (b'<svg xmlns="http://www.w3.org/2000/svg" width="64" height="64">'
+                 b'<circle cx="32" cy="32" r="30" fill="#888"/></svg>')
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = urlparse(self.path).path
+            league = re.match(r"^/v4/competitions/(\d+)/matches$", path)
+
+            if path == "/v4/matches":
+                body = {"matches": [api_match(m) for m in matches]}
+            elif league:
+                body = {"matches": [api_match(m) for m in matches
+                                    if m["league_id"] == int(league.group(1))]}
+            elif path.startswith("/crests/"):
+                self._send(200, crest_svg, "image/svg+xml")
+                return
+            else:
+                self._send(404, b"{}", "application/json")
+                return
+            self._send(200, json.dumps(body).encode(), "application/json")
+
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---------- App under test ----------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(data_dir, api_port, data_format, log_file, rate_limits=False):
+    port = free_port()
+    env = dict(os.environ,
+               PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""),
+               GOPREDICT_BACKGROUND="1",
+               FOOTBALL_API_URL=f"http://127.0.0.1:{api_port}/v4",
+               FOOTBALL_API_KEY="loadtest",
+               DATA_FORMAT=data_format,
+               RATE_LIMITS_ENABLED="1" if rate_limits else "0",
+               OTP_DB_FILE=os.path.join(data_dir, "otp.db"),
+               HISTORY_DB_FILE=os.path.join(data_dir, "history.db"),
+               CREST_DIR=os.path.join(data_dir, "crests"),
+               CREST_INDEX_FILE=os.path.join(data_dir, "crest_index.json"))
+    code = ("import app; app.app.run(host='127.0.0.1', port=%d, threaded=True, "
+            "debug=False, use_reloader=False)" % port)
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=data_dir, env=env,
+                               stdout=log_file, stderr=subprocess.STDOUT)
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"app exited with code {process.returncode}, see {log_file.name}")
+        try:
+            requests.get(base_url + "/login", timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("app did not start within 60s")
+
+
+def convert_data_files(data_dir, data_format):
+    # The app reads .gps files in snapshot mode; start from the same dataset
+    if data_format != "snapshot":
+        return
+    for name in ("users.json", "predictions.json", "matches.json"):
+        src = os.path.join(data_dir, name)
+        json_to_snapshot(src, os.path.splitext(src)[0] + SNAPSHOT_EXT)
+
+
+def read_data_file(data_dir, name, data_format):
+    path = os.path.join(data_dir, name)
+    if data_format == "snapshot":
+        return load_snapshot(os.path.splitext(path)[0] + SNAPSHOT_EXT)
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+# ---------- Load driver ----------
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.predictions = {}    # (user, match_id) -> (home, away), acknowledged by the app
+        self.bank_writes = {}    # user -> last acknowledged account number
+
+    def record(self, flow, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(flow, []).append(seconds)
+            if not ok:
+                self.errors[flow] = self.errors.get(flow, 0) + 1
+
+
+class VirtualUser:
+    def __init__(self, username, base_url, match_count, stats):
+        self.username = username
+        self.base_url = base_url
+        self.stats = stats
+        self.session = requests.Session()
+        self.remaining = random.sample(range(match_count), min(match_count, app.DAILY_PREDICTION_LIMIT))
+        self.bank_counter = 0
+
+    def _timed(self, flow, method, path, ok_statuses, check=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, allow_redirects=False,
+                                            timeout=30, **kwargs)
+            ok = response.status_code in ok_statuses and (check is None or check(response))
+        except requests.RequestException:
+            response, ok = None, False
+        self.stats.record(flow, time.perf_counter() - started, ok)
+        return response if ok else None
+
+    def login(self):
+        response = self._timed("login", "POST", "/login", (302,),
+                               data={"login_id": f"{self.username}@loadtest.local", "password": PASSWORD})
+        return response is not None and response.headers.get("Location", "").endswith("/")
+
+    def _flashed(self):
+        # The session cookie is signed with app.secret_key, which this process shares
+        cookie = self.session.cookies.get(app.app.config["SESSION_COOKIE_NAME"])
+        if not cookie:
+            return []
+        data = app.app.session_interface.get_signing_serializer(app.app).loads(cookie)
+        return [message for _, message in data.get("_flashes", [])]
+
+    def _prediction_accepted(self, response):
+        # Rejections (live match, daily limit) also redirect to "/", so check the flash too
+        if not response.headers.get("Location", "").endswith("/"):
+            return False
+        return self._flashed()[-1:] == [PREDICT_OK]
+
+    def home(self):
+        self._timed("home", "GET", "/", (200,))
+
+    def leaderboard(self):
+        self._timed("leaderboard", "GET", "/leaderboard", (200,))
+
+    def predict(self):
+        if not self.remaining:
+            self.home()
+            return
+        match_id = self.remaining.pop()
+        home, away = random.randint(0, 4), random.randint(0, 4)
+        if self._timed("predict", "POST", f"/match/{match_id}", (302,), check=self._prediction_accepted,
+                       data={"home_score": home, "away_score": away}):
+            with self.stats.lock:
+                self.stats.predictions[(self.username, str(match_id))] = (home, away)
+
+    def bank(self):
+        self.bank_counter += 1
+        account_number = f"{self.bank_counter:010d}"
+        if self._timed("bank", "POST", "/settings", (200,),
+                       data={"form_type": "bank", "bank_holder": self.username,
+                             "bank_name": "Load Bank", "account_number": account_number,
+                             "branch_code": "250655", "account_type": "Savings"}):
+            with self.stats.lock:
+                self.stats.bank_writes[self.username] = account_number
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        flow, weight = part.split("=")
+        if flow not in ("home", "predict", "leaderboard", "login", "bank"):
+            raise argparse.ArgumentTypeError(f"unknown flow '{flow}'")
+        mix[flow] = float(weight)
+    return mix
+
+
+def run_load(base_url, usernames, match_count, concurrency, duration, mix, stats):
+    vusers = [VirtualUser(u, base_url, match_count, stats) for u in usernames]
+    flows, weights = zip(*mix.items())
+    stop_at = time.time() + duration
+
+    # Workers take a free virtual user and hand it back when done, so each
+    # account runs one flow at a time (acknowledged writes have a clear order)
+    # and workers left without a free user wait instead of spinning
+    random.shuffle(vusers)
+    idle = queue.Queue()
+    for vuser in vusers:
+        idle.put(vuser)
+    cookie_name = app.app.config["SESSION_COOKIE_NAME"]
+
+    def worker():
+        while time.time() < stop_at:
+            try:
+                vuser = idle.get(timeout=max(stop_at - time.time(), 0))
+            except queue.Empty:
+                break
+            try:
+                if cookie_name not in vuser.session.cookies and not vuser.login():
+                    continue
+                flow = random.choices(flows, weights)[0]
+                getattr(vuser, flow)()
+            finally:
+                idle.put(vuser)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.time() - started
+
+
+# ---------- Report ----------
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(stats, elapsed):
+    print(f"\n{'flow':<12}{'reqs':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>9}")
+    total = errors = 0
+    for flow, values in sorted(stats.latencies.items()):
+        count, failed = len(values), stats.errors.get(flow, 0)
+        total += count
+        errors += failed
+        print(f"{flow:<12}{count:>8}{count / elapsed:>9.1f}"
+              f"{percentile(values, 50) * 1000:>9.0f}{percentile(values, 95) * 1000:>9.0f}"
+              f"{percentile(values, 99) * 1000:>9.0f}{max(values) * 1000:>9.0f}"
+              f"{failed / count:>8.1%}")
+    all_values = [v for values in stats.latencies.values() for v in values]
+    print(f"{'total':<12}{total:>8}{total / elapsed:>9.1f}"
+          f"{percentile(all_values, 50) * 1000:>9.0f}{percentile(all_values, 95) * 1000:>9.0f}"
+          f"{percentile(all_values, 99) * 1000:>9.0f}{max(all_values or [0]) * 1000:>9.0f}"
+          f"{(errors / total if total else 0):>8.1%}")
+
+
+def check_lost_writes(stats, data_dir, data_format):
+    predictions = read_data_file(data_dir, "predictions.json", data_format)
+    lost_predictions = [
+        key for key, (home, away) in stats.predictions.items()
+        if predictions.get(key[0], {}).get(key[1], {}).get("home") != home
+        or predictions.get(key[0], {}).get(key[1], {}).get("away") != away
+    ]
+
+    users = read_data_file(data_dir, "users.json", data_format)
+    lost_bank = [
+        username for username, account_number in stats.bank_writes.items()
+        if users.get(username, {}).get("bank", {}).get("account_number") != account_number
+    ]
+
+    print(f"\nPredictions acknowledged: {len(stats.predictions)}, lost: {len(lost_predictions)}")
+    print(f"Bank updates acknowledged: {len(stats.bank_writes)}, lost: {len(lost_bank)}")
+    return len(lost_predictions) + len(lost_bank)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kickoff-surge load test for GoPredict")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--matches", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"flow weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--data-format", choices=["json", "snapshot"], default="json")
+    parser.add_argument("--hash-method", default="scrypt")
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="keep the app's rate limits on (all virtual users share one IP)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary data directory")
+    args = parser.parse_args(argv)
+
+    data_dir = tempfile.mkdtemp(prefix="gopredict-load-")
+    matches = []
+    api = start_fake_api(matches)
+    crest_base = f"http://127.0.0.1:{api.server_address[1]}/crests"
+    usernames, generated = generate_dataset(data_dir, args.users, args.matches,
+                                            args.hash_method, crest_base)
+    matches.extend(generated)
+    convert_data_files(data_dir, args.data_format)
+
+    log_file = open(os.path.join(data_dir, "app.log"), "w")
+    process, base_url = start_app(data_dir, api.server_address[1], args.data_format, log_file,
+                                  args.rate_limits)
+    print(f"🚀 App at {base_url}, data in {data_dir}")
+
+    stats = Stats()
+    try:
+        elapsed = run_load(base_url, usernames, len(matches), args.concurrency,
+                           args.duration, args.mix, stats)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        api.shutdown()
+        log_file.close()
+
+    report(stats, elapsed)
+    lost = check_lost_writes(stats, data_dir, args.data_format)
+
+    if not args.keep:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return 1 if lost else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
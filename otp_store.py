@@ -0,0 +1,127 @@
+import os
+import random
+import sqlite3
+import time
+
+# One-time codes live in a small SQLite file instead of users.json, so every
+# worker process sees the same codes and issuing/checking a code never
+# rewrites the users file.
+
+# ---------- Settings ----------
+OTP_DB_FILE = os.getenv("OTP_DB_FILE", "otp.db")
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "600"))   # 10 minutes
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+
+# check_otp() results
+OTP_OK = "ok"
+OTP_INVALID = "invalid"
+OTP_EXPIRED = "expired"      # also returned when no code was issued
+OTP_LOCKED = "locked"        # too many wrong attempts
+
+
+def _connect():
+    conn = sqlite3.connect(OTP_DB_FILE, timeout=5, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS otps (
+            purpose    TEXT NOT NULL,
+            username   TEXT NOT NULL,
+            code       TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            attempts   INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (purpose, username)
+        )
+    """)
+    return conn
+
+
+def purge_expired(conn=None):
+    """Evicts every expired code. Runs automatically whenever a code is issued."""
+    own = conn is None
+    conn = conn or _connect()
+    try:
+        return conn.execute("DELETE FROM otps WHERE expires_at <= ?", (time.time(),)).rowcount
+    finally:
+        if own:
+            conn.close()
+
+
+def issue_otp(purpose, username, ttl=None):
+    """Creates (or replaces) the code for (purpose, username) and returns it.
+
+    Returns None while a locked code is still unexpired. Wrong attempts carry
+    over to a replacement code, so re-issuing never resets the guess budget.
+    """
+    code = str(random.SystemRandom().randint(100000, 999999))
+    expires_at = time.time() + (OTP_TTL_SECONDS if ttl is None else ttl)
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        purge_expired(conn)
+        row = conn.execute(
+            "SELECT attempts FROM otps WHERE purpose = ? AND username = ?",
+            (purpose, username),
+        ).fetchone()
+        attempts = row[0] if row else 0
+        if attempts >= OTP_MAX_ATTEMPTS:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "INSERT OR REPLACE INTO otps (purpose, username, code, expires_at, attempts) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (purpose, username, code, expires_at, attempts),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return code
+
+
+def has_active_otp(purpose, username):
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT 1 FROM otps WHERE purpose = ? AND username = ? AND expires_at > ?",
+            (purpose, username, time.time()),
+        ).fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+
+def check_otp(purpose, username, entered):
+    """Checks a code; a correct code is consumed so it can only be used once."""
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT code, expires_at, attempts FROM otps WHERE purpose = ? AND username = ?",
+            (purpose, username),
+        ).fetchone()
+
+        if row is None or row[1] <= time.time():
+            conn.execute("DELETE FROM otps WHERE purpose = ? AND username = ?", (purpose, username))
+            result = OTP_EXPIRED
+        elif row[2] >= OTP_MAX_ATTEMPTS:
+            result = OTP_LOCKED   # the row stays until it expires, blocking new codes
+        elif entered == row[0]:
+            conn.execute("DELETE FROM otps WHERE purpose = ? AND username = ?", (purpose, username))
+            result = OTP_OK
+        else:
+            conn.execute(
+                "UPDATE otps SET attempts = attempts + 1 WHERE purpose = ? AND username = ?",
+                (purpose, username),
+            )
+            result = OTP_LOCKED if row[2] + 1 >= OTP_MAX_ATTEMPTS else OTP_INVALID
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return result
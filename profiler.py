@@ -0,0 +1,112 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import g, request
+
+# Opt-in profiler for slow requests and scheduler jobs. A sampled fraction of
+# requests/jobs runs under cProfile; any that take longer than the threshold
+# are written to PROFILE_DIR as <timestamp>_<name>_<ms>ms.prof (load with
+# pstats or snakeviz) plus a .txt summary. Only the newest PROFILE_KEEP
+# profiles are kept.
+#
+#   PROFILE_SAMPLE_RATE=0.1 PROFILE_THRESHOLD_MS=300 python app.py
+
+# ---------- Settings ----------
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))   # 0 = off, 1 = every request
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", "500"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+
+# Only one cProfile can be active per process (Python 3.12+ enforces it), so
+# concurrent candidates are skipped rather than queued.
+_active = threading.Lock()
+_rotate_lock = threading.Lock()
+
+
+def _start():
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    if not _active.acquire(blocking=False):
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler (e.g. a debugger) is already running
+        _active.release()
+        return None
+    return profile, time.perf_counter()
+
+
+def _stop(token, name):
+    profile, started = token
+    profile.disable()
+    _active.release()
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms >= PROFILE_THRESHOLD_MS:
+        _save(profile, name, elapsed_ms)
+
+
+def _save(profile, name, elapsed_ms):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "-", name).strip("-") or "unknown"
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    base = os.path.join(PROFILE_DIR, f"{stamp}_{safe_name}_{elapsed_ms:.0f}ms")
+
+    profile.dump_stats(base + ".prof")
+    summary = io.StringIO()
+    pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(30)
+    with open(base + ".txt", "w") as f:
+        f.write(f"{name} took {elapsed_ms:.0f}ms\n\n{summary.getvalue()}")
+    print(f"🐢 Slow {name} ({elapsed_ms:.0f}ms) profiled → {base}.prof")
+    _rotate()
+
+
+def _rotate():
+    with _rotate_lock:
+        profiles = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".prof"))
+        for old in profiles[:max(len(profiles) - PROFILE_KEEP, 0)]:
+            base = os.path.join(PROFILE_DIR, old[:-len(".prof")])
+            for ext in (".prof", ".txt"):
+                try:
+                    os.remove(base + ext)
+                except OSError:
+                    pass
+
+
+# ---------- Hooks ----------
+def init_profiling(app):
+    """Profiles sampled Flask requests that run longer than the threshold."""
+    if PROFILE_SAMPLE_RATE <= 0:
+        return
+
+    @app.before_request
+    def start_request_profile():
+        g._profile = _start()
+
+    @app.teardown_request
+    def stop_request_profile(exc):
+        token = g.pop("_profile", None)
+        if token is not None:
+            _stop(token, f"{request.method}-{request.endpoint or request.path}")
+
+
+def profiled_job(name, func):
+    """Wraps an APScheduler job so slow runs are profiled too."""
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+        token = _start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if token is not None:
+                _stop(token, f"job-{name}")
+    return wrapped
@@ -0,0 +1,129 @@
+import bisect
+
+# Order-statistic index over user points: a Fenwick tree counts users per
+# point value, and each point value keeps its users in a name-sorted list.
+# Rank, percentile and "around me" queries are O(log P + log T) (P = highest
+# score, T = users tied on that score) instead of sorting the whole
+# leaderboard. Updates are O(log P + T): inserting into or deleting from a
+# bucket list shifts the names after it. Most ties are small; the 0-point
+# bucket can be large, but the shift is a single memmove of pointers.
+#
+# Ordering matches the leaderboard: most points first, ties by username.
+
+
+class RankIndex:
+    def __init__(self, scores=None):
+        self._size = 64
+        self._tree = [0] * (self._size + 1)
+        self._buckets = {}      # points -> sorted usernames
+        self._points = {}       # username -> points
+        for username, points in (scores or {}).items():
+            self.update(username, points)
+
+    # ---------- Fenwick tree ----------
+    def _add(self, points, delta):
+        i = points + 1
+        while i <= self._size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, points):
+        """Number of users with at most `points` points."""
+        i = min(points + 1, self._size)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _grow(self, points):
+        while points + 1 > self._size:
+            self._size *= 2
+        self._tree = [0] * (self._size + 1)
+        for value, users in self._buckets.items():
+            self._add(value, len(users))
+
+    def _find(self, count):
+        """Smallest point value whose prefix count exceeds `count`."""
+        pos = 0
+        step = 1 << self._size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self._size and self._tree[nxt] <= count:
+                pos = nxt
+                count -= self._tree[nxt]
+            step >>= 1
+        return pos  # tree index pos + 1 holds points value pos
+
+    # ---------- Updates ----------
+    def update(self, username, points):
+        points = max(int(points), 0)
+        if self._points.get(username) == points:
+            return
+        self.remove(username)
+        if points + 1 > self._size:
+            self._grow(points)
+        self._points[username] = points
+        bisect.insort(self._buckets.setdefault(points, []), username)
+        self._add(points, 1)
+
+    def remove(self, username):
+        points = self._points.pop(username, None)
+        if points is None:
+            return
+        users = self._buckets[points]
+        del users[bisect.bisect_left(users, username)]
+        if not users:
+            del self._buckets[points]
+        self._add(points, -1)
+
+    # ---------- Queries ----------
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, username):
+        return username in self._points
+
+    def points(self, username):
+        return self._points.get(username)
+
+    def rank(self, username):
+        """1-based leaderboard position, or None for unknown users."""
+        points = self._points.get(username)
+        if points is None:
+            return None
+        ahead = len(self._points) - self._prefix(points)
+        return ahead + bisect.bisect_left(self._buckets[points], username) + 1
+
+    def percentile(self, username):
+        """Share of users (0-100) with fewer points."""
+        points = self._points.get(username)
+        if points is None:
+            return None
+        below = self._prefix(points - 1) if points > 0 else 0
+        return round(100 * below / len(self._points), 1)
+
+    def at(self, rank):
+        """(username, points) at a 1-based position."""
+        if not 1 <= rank <= len(self._points):
+            raise IndexError(rank)
+        from_bottom = len(self._points) - rank
+        points = self._find(from_bottom)
+        ahead = len(self._points) - self._prefix(points)
+        username = self._buckets[points][rank - 1 - ahead]
+        return username, points
+
+    def around(self, username, n=2):
+        """The user plus up to n users above and below, as leaderboard rows."""
+        rank = self.rank(username)
+        if rank is None:
+            return []
+        first, last = max(1, rank - n), min(len(self._points), rank + n)
+        return [self._row(r) for r in range(first, last + 1)]
+
+    def top(self, n):
+        return [self._row(r) for r in range(1, min(n, len(self._points)) + 1)]
+
+    def _row(self, rank):
+        username, points = self.at(rank)
+        return {"rank": rank, "username": username, "points": points}
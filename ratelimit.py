@@ -0,0 +1,141 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from flask import Response, request, session
+
+# Token-bucket rate limiting for expensive routes. Each (route, client) pair
+# gets a bucket of `burst` tokens refilled at `per_minute`; clients are the
+# logged-in username, or the IP address before login. Over-budget requests get
+# a plain 429 before the view runs.
+#
+# Buckets live in memory by default (per process). Set RATE_LIMIT_DB to a
+# SQLite file to share them between worker processes.
+#
+# Anonymous clients are keyed by request.remote_addr. Behind a reverse proxy
+# that is the proxy's address, so every visitor would share one bucket; set
+# TRUST_PROXY_HOPS (see app.py) so it comes from X-Forwarded-For instead.
+
+# ---------- Settings ----------
+RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS_ENABLED", "1") == "1"
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB")   # unset = in-process buckets
+EVICT_EVERY = 1000   # calls between sweeps for idle buckets
+
+
+class MemoryBuckets:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}     # key -> (tokens, updated, seconds to refill completely)
+        self._calls = 0
+
+    def take(self, key, burst, rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (burst, now, 0))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, burst / rate)
+
+            self._calls += 1
+            if self._calls % EVICT_EVERY == 0:
+                self._evict(now)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def _evict(self, now):
+        # A bucket that would have refilled completely is the same as no bucket
+        for key in [k for k, (_, updated, refill) in self._buckets.items() if now - updated > refill]:
+            del self._buckets[key]
+
+
+class SQLiteBuckets:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._calls = 0        # per process; any process's sweep clears everyone's idle buckets
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key     TEXT PRIMARY KEY,
+                    tokens  REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS buckets_updated ON buckets (updated)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def take(self, key, burst, rate):
+        now = time.time()
+        with self._lock:
+            self._calls += 1
+            evict = self._calls % EVICT_EVERY == 0
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(now - updated, 0) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            if evict:
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - 86400,))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+_counters_lock = threading.Lock()
+rate_limit_counters = {}   # endpoint -> {"allowed": n, "limited": n}
+
+
+def _count(endpoint, allowed):
+    with _counters_lock:
+        counter = rate_limit_counters.setdefault(endpoint, {"allowed": 0, "limited": 0})
+        counter["allowed" if allowed else "limited"] += 1
+
+
+def get_rate_limit_stats():
+    with _counters_lock:
+        return {endpoint: dict(counter) for endpoint, counter in rate_limit_counters.items()}
+
+
+def init_rate_limiting(app, limits):
+    """limits: {endpoint: (burst, per_minute, methods or None for all)}."""
+    if not RATE_LIMITS_ENABLED:
+        return
+    buckets = SQLiteBuckets(RATE_LIMIT_DB) if RATE_LIMIT_DB else MemoryBuckets()
+
+    @app.before_request
+    def check_rate_limit():
+        limit = limits.get(request.endpoint)
+        if limit is None:
+            return None
+        burst, per_minute, methods = limit
+        if methods and request.method not in methods:
+            return None
+
+        client = session.get("username")
+        client = f"user:{client}" if client else f"ip:{request.remote_addr}"
+        allowed, retry_after = buckets.take(f"{request.endpoint}|{client}", burst, per_minute / 60)
+        _count(request.endpoint, allowed)
+        if allowed:
+            return None
+        return Response("⏳ Too many requests, please slow down.", status=429,
+                        headers={"Retry-After": str(math.ceil(retry_after))},
+                        mimetype="text/plain")
@@ -0,0 +1,189 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+# Indexed snapshot format for the data files (users, predictions, matches).
+#
+# Layout (all integers little-endian):
+#   header  MAGIC | version u16 | kind u8 | reserved u8 | count u32 | index_offset u64
+#   records one per entry: compact JSON value (utf-8), back to back
+#   index   per entry: key_len u16 | key utf-8 | value_offset u64 | value_len u32
+#
+# The file is memory-mapped and only the index is read up front, so looking up
+# one user's record decodes that record and nothing else (app.match() reads a
+# user's predictions this way). It is not smaller than compact JSON: the index
+# adds a few bytes per entry, and whole-file loads decode every record anyway.
+#
+# Convert existing files with:
+#   python snapshot.py to-snapshot predictions.json predictions.gps
+#   python snapshot.py to-json predictions.gps predictions.json
+
+MAGIC = b"GPSNAP"
+VERSION = 1
+SNAPSHOT_EXT = ".gps"
+
+KIND_DICT = 0   # top-level JSON object, keyed by its own keys
+KIND_LIST = 1   # top-level JSON array, keyed by list index
+
+_HEADER = struct.Struct("<6sHBBIQ")
+_INDEX_ENTRY = struct.Struct("<QI")
+_KEY_LEN = struct.Struct("<H")
+
+
+# mkstemp creates 0600 files; new data files get the usual umask-based mode instead
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def replace_file(tmp, path):
+    """Renames tmp over path, keeping path's permissions (or the umask default for new files)."""
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(tmp, mode)
+    os.replace(tmp, path)
+
+
+class SnapshotError(Exception):
+    """Raised for files that are not snapshots or use an unknown version."""
+
+
+def _encode(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def write_snapshot(path, data):
+    """Writes a dict or list atomically (temp file + rename), so readers never see half a file."""
+    if isinstance(data, dict):
+        kind, items = KIND_DICT, ((str(k), v) for k, v in data.items())
+    elif isinstance(data, list):
+        kind, items = KIND_LIST, ((str(i), v) for i, v in enumerate(data))
+    else:
+        raise TypeError("snapshots hold a dict or a list")
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    index = []
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        offset = _HEADER.size
+        for key, value in items:
+            blob = _encode(value)
+            f.write(blob)
+            index.append((key.encode("utf-8"), offset, len(blob)))
+            offset += len(blob)
+
+        index_offset = offset
+        for key, value_offset, value_len in index:
+            f.write(_KEY_LEN.pack(len(key)))
+            f.write(key)
+            f.write(_INDEX_ENTRY.pack(value_offset, value_len))
+
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, kind, 0, len(index), index_offset))
+        f.flush()
+        os.fsync(f.fileno())
+    replace_file(tmp, path)
+
+
+class SnapshotReader:
+    """Read-only, lazily decoded view of a snapshot file."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError(f"{path} is empty")
+
+        magic, version, kind, _, count, index_offset = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotError(f"{path} is not a snapshot file")
+        if version != VERSION:
+            self.close()
+            raise SnapshotError(f"{path} uses snapshot version {version}, expected {VERSION}")
+
+        self.kind = kind
+        self._index = {}
+        pos = index_offset
+        for _ in range(count):
+            (key_len,) = _KEY_LEN.unpack_from(self._map, pos)
+            pos += _KEY_LEN.size
+            key = self._map[pos:pos + key_len].decode("utf-8")
+            pos += key_len
+            self._index[key] = _INDEX_ENTRY.unpack_from(self._map, pos)
+            pos += _INDEX_ENTRY.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return str(key) in self._index
+
+    def __getitem__(self, key):
+        offset, length = self._index[str(key)]
+        return json.loads(self._map[offset:offset + length])
+
+    def get(self, key, default=None):
+        if str(key) not in self._index:
+            return default
+        return self[key]
+
+    def keys(self):
+        return list(self._index)
+
+    def items(self):
+        for key in self._index:
+            yield key, self[key]
+
+    def to_python(self):
+        if self.kind == KIND_LIST:
+            return [self[key] for key in self._index]
+        return dict(self.items())
+
+
+def load_snapshot(path):
+    with SnapshotReader(path) as reader:
+        return reader.to_python()
+
+
+def read_snapshot_record(path, key, default=None):
+    """Decodes a single record without touching the rest of the file."""
+    with SnapshotReader(path) as reader:
+        return reader.get(key, default)
+
+
+# ---------- Converter ----------
+def json_to_snapshot(src, dst):
+    with open(src, "r") as f:
+        write_snapshot(dst, json.load(f))
+
+
+def snapshot_to_json(src, dst):
+    data = load_snapshot(src)
+    with open(dst, "w") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    commands = {"to-snapshot": json_to_snapshot, "to-json": snapshot_to_json}
+    if len(sys.argv) != 4 or sys.argv[1] not in commands:
+        print("Usage: python snapshot.py to-snapshot|to-json <src> <dst>")
+        sys.exit(1)
+    commands[sys.argv[1]](sys.argv[2], sys.argv[3])
+    print(f"✅ Converted {sys.argv[2]} → {sys.argv[3]}")